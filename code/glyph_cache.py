@@ -0,0 +1,150 @@
+import atexit
+import hashlib
+import os
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_CACHE_DIR = ".glyph_cache"
+
+
+@lru_cache(maxsize=None)
+def _hash_file(path, size, mtime_ns):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def font_file_hash(font_path):
+    """Хэш содержимого файла шрифта (пересчитывается только при изменении файла)."""
+    stat = os.stat(font_path)
+    return _hash_file(os.path.abspath(font_path), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=None)
+def load_font(font_path, font_size):
+    return ImageFont.truetype(font_path, font_size)
+
+
+def render_glyph(char, font, margin=10, crop=False):
+    """
+    Растеризация символа, как в лабораторных:
+    crop=True - холст 2*size, текст в точке (margin, margin), обрезка по getbbox (lab5, lab6);
+    crop=False - холст по textbbox с полями margin (lab7).
+    """
+    if crop:
+        image = Image.new("L", (font.size * 2, font.size * 2), 255)
+        draw = ImageDraw.Draw(image)
+        draw.text((margin, margin), char, font=font, fill=0)
+        image = image.crop(image.getbbox())
+    else:
+        dummy_img = Image.new("L", (1, 1), 255)
+        bbox = ImageDraw.Draw(dummy_img).textbbox((0, 0), char, font=font)
+        width = bbox[2] - bbox[0] + 2 * margin
+        height = bbox[3] - bbox[1] + 2 * margin
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        draw.text((margin, margin), char, font=font, fill=0)
+    return np.array(image)
+
+
+def _store_key(char, margin, crop):
+    return "-".join(f"{ord(c):x}" for c in char) + f"_{margin}_{int(crop)}"
+
+
+class GlyphCache:
+    """
+    Кэш растров символов с ключом (хэш шрифта, размер, символ, поля, обрезка).
+    В памяти держится не больше max_entries растров (вытеснение LRU), на диске -
+    один .npz на пару (шрифт, размер) в cache_dir. Новые растры записываются в flush():
+    при переходе к другой паре (шрифт, размер) и при накоплении max_entries
+    незаписанных растров. Для общего кэша flush() вызывается и при завершении программы.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=4096):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._stores = {}
+        self._pending = {}
+        self._current = None
+
+    def _store_path(self, font_hash, font_size):
+        return os.path.join(self.cache_dir, f"{font_hash}_{font_size}.npz")
+
+    def _store(self, font_hash, font_size):
+        key = (font_hash, font_size)
+        if key not in self._stores:
+            path = self._store_path(font_hash, font_size)
+            self._stores[key] = np.load(path) if os.path.exists(path) else None
+        return self._stores[key]
+
+    def get(self, char, font_path, font_size, margin=10, crop=False):
+        font_hash = font_file_hash(font_path)
+        key = (font_hash, font_size, char, margin, crop)
+        glyph = self._memory.get(key)
+        if glyph is not None:
+            self._memory.move_to_end(key)
+            return glyph
+
+        # незаписанные растры есть только у текущей пары (шрифт, размер)
+        if self._current != (font_hash, font_size):
+            self.flush()
+            self._current = (font_hash, font_size)
+
+        store_key = _store_key(char, margin, crop)
+        pending = self._pending.setdefault((font_hash, font_size), {})
+        store = self._store(font_hash, font_size)
+        if store_key in pending:
+            glyph = pending[store_key]
+        elif store is not None and store_key in store.files:
+            glyph = store[store_key]
+        else:
+            glyph = render_glyph(char, load_font(font_path, font_size), margin, crop)
+            pending[store_key] = glyph
+            if len(pending) >= self.max_entries:
+                self.flush()
+        glyph.flags.writeable = False
+
+        self._memory[key] = glyph
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+        return glyph
+
+    def flush(self):
+        for (font_hash, font_size), pending in self._pending.items():
+            if not pending:
+                continue
+            os.makedirs(self.cache_dir, exist_ok=True)
+            store = self._stores.get((font_hash, font_size))
+            glyphs = {name: store[name] for name in store.files} if store is not None else {}
+            if store is not None:
+                store.close()
+            glyphs.update(pending)
+
+            path = self._store_path(font_hash, font_size)
+            tmp_path = path + ".tmp.npz"
+            np.savez_compressed(tmp_path, **glyphs)
+            os.replace(tmp_path, path)
+            self._stores[(font_hash, font_size)] = np.load(path)
+            pending.clear()
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = GlyphCache()
+        atexit.register(_default_cache.flush)
+    return _default_cache
+
+
+def get_glyph(char, font_path, font_size, margin=10, crop=False):
+    """Растр символа (uint8, только для чтения) из общего кэша."""
+    return default_cache().get(char, font_path, font_size, margin, crop)
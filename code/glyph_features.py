@@ -0,0 +1,65 @@
+import numpy as np
+
+
+def stack_glyphs(masks):
+    """
+    Набор бинарных масок символов разного размера -> массив (G, H_max, W_max),
+    дополненный нулями справа и снизу, и размеры (G, 2) в виде (h, w).
+    """
+    sizes = np.array([mask.shape for mask in masks], dtype=np.int64).reshape(-1, 2)
+    height, width = sizes.max(axis=0) if len(masks) else (0, 0)
+    stack = np.zeros((len(masks), height, width), dtype=bool)
+    for g, mask in enumerate(masks):
+        stack[g, :mask.shape[0], :mask.shape[1]] = mask
+    return stack, sizes
+
+
+def _rectangle_sums(sat, glyphs, y0, y1, x0, x1):
+    return sat[glyphs, y1, x1] - sat[glyphs, y0, x1] - sat[glyphs, y1, x0] + sat[glyphs, y0, x0]
+
+
+def batch_moments(stack, sizes):
+    """
+    Признаки сразу для всех символов стопки по сырым моментам маски
+    (суммы x, y, x^2, y^2 с весом маски) без списков координат:
+    веса четвертей, центр тяжести, центральные моменты инерции и профили X/Y.
+    Для пустых масок центр и моменты равны nan.
+    """
+    count, height, width = stack.shape
+    h = sizes[:, 0]
+    w = sizes[:, 1]
+
+    x_profile = stack.sum(axis=1, dtype=np.int64)
+    y_profile = stack.sum(axis=2, dtype=np.int64)
+    xs = np.arange(width, dtype=np.float64)
+    ys = np.arange(height, dtype=np.float64)
+
+    mass = x_profile.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_c = (x_profile @ xs) / mass
+        y_c = (y_profile @ ys) / mass
+    # сумма (y - y_c)^2 = сумма y^2 - mass * y_c^2
+    I_x = y_profile @ ys**2 - mass * y_c**2
+    I_y = x_profile @ xs**2 - mass * x_c**2
+
+    # веса четвертей по интегральному изображению каждой маски
+    sat = np.zeros((count, height + 1, width + 1), dtype=np.int64)
+    np.cumsum(stack, axis=1, out=sat[:, 1:, 1:])
+    np.cumsum(sat[:, 1:, 1:], axis=2, out=sat[:, 1:, 1:])
+    glyphs = np.arange(count)
+    half_h = h // 2
+    half_w = w // 2
+    zeros = np.zeros_like(h)
+    weights = np.stack([
+        _rectangle_sums(sat, glyphs, zeros, half_h, zeros, half_w),
+        _rectangle_sums(sat, glyphs, zeros, half_h, half_w, w),
+        _rectangle_sums(sat, glyphs, half_h, h, zeros, half_w),
+        _rectangle_sums(sat, glyphs, half_h, h, half_w, w),
+    ], axis=1)
+
+    return {
+        "mass": mass, "weights": weights,
+        "x_c": x_c, "y_c": y_c,
+        "I_x": I_x, "I_y": I_y,
+        "x_profile": x_profile, "y_profile": y_profile,
+    }
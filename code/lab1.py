@@ -1,6 +1,7 @@
 from PIL import Image
 import numpy as np
 import math
+import time
 
 input_filename = 'image.png' 
 image = Image.open(input_filename) 
@@ -53,7 +54,44 @@ def rgb_to_hsi(image):
 
     return H, S, I
 
-H, S, I = rgb_to_hsi(image)
+
+def _hsi_strip(rgb_strip):
+    img_array = rgb_strip.astype(np.float32) / 255.0
+    R = img_array[:, :, 0]
+    G = img_array[:, :, 1]
+    B = img_array[:, :, 2]
+
+    I = (R + G + B) / 3.0
+    S = 1 - (np.minimum(np.minimum(R, G), B) / (I + 1e-10))
+    num = 0.5 * ((R - G) + (R - B))
+    den = np.sqrt((R - G) ** 2 + (R - B) * (G - B)) + 1e-10
+    theta = np.arccos(np.clip(num / den, -1, 1))
+    H = np.where(B > G, 2 * np.pi - theta, theta) / (2 * np.pi)
+    return H, S, I
+
+
+def rgb_to_hsi_tiled(image, strip_rows=256, dtype=np.float32, out=None):
+    """
+    HSI по полосам из strip_rows строк: временные массивы занимают память только
+    под одну полосу, результат пишется в заранее выделенные буферы H, S, I.
+    dtype: np.float32, np.float16 или np.uint8 (значения [0, 1] квантуются в 0..255).
+    out: необязательный кортеж (H, S, I) формы (height, width), например np.memmap.
+    """
+    width, height = image.size
+    if out is None:
+        out = tuple(np.empty((height, width), dtype=dtype) for _ in range(3))
+    for y0 in range(0, height, strip_rows):
+        y1 = min(y0 + strip_rows, height)
+        # crop + asarray читает из PIL только текущую полосу
+        strip = np.asarray(image.crop((0, y0, width, y1)).convert('RGB'))
+        for dst, src in zip(out, _hsi_strip(strip)):
+            if dst.dtype == np.uint8:
+                dst[y0:y1] = src * 255
+            else:
+                dst[y0:y1] = src
+    return out
+
+H, S, I = rgb_to_hsi_tiled(image)
 
 I_image = Image.fromarray((I * 255).astype(np.uint8))
 I_image.save('Output_Intensity.png')
@@ -63,7 +101,43 @@ I_inverted_img = Image.fromarray((I_inverted * 255).astype(np.uint8))
 I_inverted_img.save('Output_Inverted_Intensity.png')
 
 
+def resample_indices(length, mode, factor):
+    """
+    Индексы исходных строк/столбцов для каждого пикселя результата (ближайший сосед).
+    mode: 'stretch' (растяжение в M раз), 'compress' (сжатие в N раз),
+    'one_pass' (передискретизация с коэффициентом K = M / N),
+    'two_pass' (растяжение в M раз и сжатие в N раз, factor = (M, N)).
+    """
+    if mode == 'stretch':
+        return np.arange(length * factor) // factor
+    if mode == 'compress':
+        return np.arange(length // factor) * factor
+    if mode == 'one_pass':
+        # тот же порядок операций с плавающей точкой, что и int(new_x * K)
+        new_length = int(length / factor)
+        return (np.arange(new_length) * factor).astype(np.intp)
+    if mode == 'two_pass':
+        # композиция индексов растяжения и сжатия: floor(floor(y * N) / M),
+        # промежуточное изображение в M раз больше не строится
+        M, N = factor
+        return np.arange(length * M // N) * N // M
+    raise ValueError(f'Неизвестный режим передискретизации: {mode}')
+
+
+def resample_image(image, mode, factor):
+    src_width, src_height = image.size
+    rows = resample_indices(src_height, mode, factor)
+    cols = resample_indices(src_width, mode, factor)
+    arr = np.asarray(image)
+    # один gather по заранее построенным индексам вместо putpixel для каждого пикселя
+    return Image.fromarray(arr[rows[:, None], cols])
+
+
 def stretch_image(image, M):
+    return resample_image(image, 'stretch', M)
+
+
+def stretch_image_putpixel(image, M):
     src_width, src_height = image.size
     new_width = src_width * M
     new_height = src_height * M
@@ -83,6 +157,10 @@ stretched_img.save('Output_Stretched.png')
 
 
 def compress_image(image, N):
+    return resample_image(image, 'compress', N)
+
+
+def compress_image_putpixel(image, N):
     src_width, src_height = image.size
     new_width = src_width // N
     new_height = src_height // N
@@ -100,8 +178,10 @@ compressed_img = compress_image(image, N)
 compressed_img.save('Output_Compressed.png')
 
 def two_pass_resample(image, M, N):
-    M = 3
-    N = 2
+    return resample_image(image, 'two_pass', (M, N))
+
+
+def two_pass_resample_materialized(image, M, N):
     stretched = stretch_image(image, M)
     result = compress_image(stretched, N)
     return result
@@ -111,6 +191,10 @@ two_pass_img = two_pass_resample(image, M, N)
 two_pass_img.save('Output_TwoPass_Resampled.png')
 
 def one_pass_resample(image, K):
+    return resample_image(image, 'one_pass', K)
+
+
+def one_pass_resample_putpixel(image, K):
     src_width, src_height = image.size
 
     new_width = int(src_width / K)
@@ -127,6 +211,43 @@ def one_pass_resample(image, K):
 one_pass_img = one_pass_resample(image, K)
 one_pass_img.save('Output_OnePass_Resampled.png')
 
+
+def benchmark_resampling(image, M, N, crop_size=256, repeats=3):
+    """
+    Сравнение векторизованной передискретизации с попиксельной (putpixel) версией,
+    а для двух проходов - еще и с растяжением и сжатием через промежуточное изображение.
+    Попиксельная версия медленная, поэтому замер идет на фрагменте crop_size x crop_size.
+    """
+    sample = image.crop((0, 0, min(crop_size, image.width), min(crop_size, image.height)))
+    cases = [
+        ('stretch', stretch_image, stretch_image_putpixel, M, 'putpixel'),
+        ('compress', compress_image, compress_image_putpixel, N, 'putpixel'),
+        ('one_pass', one_pass_resample, one_pass_resample_putpixel, M / N, 'putpixel'),
+        ('two_pass', lambda img, f: two_pass_resample(img, *f),
+         lambda img, f: compress_image_putpixel(stretch_image_putpixel(img, f[0]), f[1]), (M, N),
+         'putpixel'),
+        # одна выборка индексов против растяжения и сжатия с промежуточным изображением
+        ('two_pass', lambda img, f: two_pass_resample(img, *f),
+         lambda img, f: two_pass_resample_materialized(img, *f), (M, N), 'materialized'),
+    ]
+    results = {}
+    for name, fast_fn, slow_fn, factor, baseline in cases:
+        start = time.perf_counter()
+        slow = slow_fn(sample, factor)
+        slow_time = time.perf_counter() - start
+
+        fast_time = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fast = fast_fn(sample, factor)
+            fast_time = min(fast_time, time.perf_counter() - start)
+
+        identical = np.array_equal(np.asarray(slow), np.asarray(fast))
+        results[(name, baseline)] = (slow_time, fast_time, identical)
+        print(f'{name}: {baseline} {slow_time:.4f} c, numpy {fast_time:.4f} c, '
+              f'ускорение x{slow_time / fast_time:.1f}, совпадение: {identical}')
+    return results
+
 report_text = f"""# Отчет по лабораторной работе
 
 ## 1. Выделение компонент R, G, B
@@ -176,3 +297,4 @@ if __name__ == "__main__":
     print("Output_Stretched.png, Output_Compressed.png, Output_TwoPass_Resampled.png, Output_OnePass_Resampled.png")
     print("Отчет сохранен в файле report_lab1.md")
     print(f'M = {M}, N = {N}, K = {K}')
+    benchmark_resampling(image, M, N)
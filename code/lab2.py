@@ -1,3 +1,9 @@
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
 from PIL import Image
 
@@ -45,6 +51,141 @@ def adaptive_binarization(gray_array, window_size, k, R):
     
     return binary_arr
 
+def _window_sums(padded: np.ndarray, window_size: int) -> np.ndarray:
+    # суммы по всем окнам window_size x window_size через интегральное изображение
+    sat = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=padded.dtype)
+    np.cumsum(padded, axis=0, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    w = window_size
+    return sat[w:, w:] - sat[:-w, w:] - sat[w:, :-w] + sat[:-w, :-w]
+
+def _sliding_max(padded: np.ndarray, window_size: int, axis: int) -> np.ndarray:
+    # максимум в скользящем окне по алгоритму ван Херка / Гиля-Вермана:
+    # префиксные и суффиксные максимумы внутри блоков длины window_size
+    a = np.moveaxis(padded, axis, -1)
+    n = a.shape[-1]
+    out_len = n - window_size + 1
+    tail = (-n) % window_size
+    if tail:
+        a = np.pad(a, [(0, 0)] * (a.ndim - 1) + [(0, tail)], mode='edge')
+    blocks = a.reshape(a.shape[:-1] + (-1, window_size))
+    prefix = np.maximum.accumulate(blocks, axis=-1).reshape(a.shape)
+    suffix = np.maximum.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(a.shape)
+    result = np.maximum(suffix[..., :out_len], prefix[..., window_size - 1:window_size - 1 + out_len])
+    return np.moveaxis(result, -1, axis)
+
+def compute_local_statistics_map(image: np.ndarray, window_size: int) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Среднее, СКО и максимум для окна вокруг каждого пикселя с тем же ограничением
+    координат по краям, что и в compute_local_statistics. Стоимость не зависит от window_size.
+    """
+    half_win = window_size // 2
+    # как и в compute_local_statistics, окно всегда нечетное: 2 * half_win + 1
+    size = 2 * half_win + 1
+    padded = np.pad(image, half_win, mode='edge')
+    count = np.float32(size * size)
+
+    values = padded.astype(np.int64)
+    sums = _window_sums(values, size)
+    sq_sums = _window_sums(values * values, size)
+
+    mean = sums.astype(np.float32) / count
+    var = sq_sums.astype(np.float64) / count - (sums.astype(np.float64) / count) ** 2
+    std = np.sqrt(np.maximum(var, 0)).astype(np.float32)
+
+    max_val = _sliding_max(_sliding_max(padded, size, axis=0), size, axis=1)
+    return mean, std, max_val.astype(np.float32)
+
+def adaptive_binarization_fast(gray_array, window_size, k, R):
+    m, s, local_max = compute_local_statistics_map(gray_array, window_size)
+    m_max = (local_max + m) / 2.0
+    T = m_max * (1 - k * (1 - s / R))
+    return np.where(gray_array >= T, 255, 0).astype(np.uint8)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+def collect_inputs(source: str) -> list:
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+def output_paths(input_path: str, output_dir: str) -> (str, str):
+    # расширение входит в имя, чтобы a.png и a.jpg не писали в один файл
+    stem, ext = os.path.splitext(os.path.basename(input_path))
+    stem = stem + '_' + ext.lstrip('.').lower()
+    return (os.path.join(output_dir, stem + '_grayscale.bmp'),
+            os.path.join(output_dir, stem + '_binary.bmp'))
+
+def is_up_to_date(input_path: str, outputs) -> bool:
+    source_mtime = os.path.getmtime(input_path)
+    return all(os.path.exists(p) and os.path.getmtime(p) >= source_mtime for p in outputs)
+
+def binarize_file(input_path: str, output_dir: str, window_size: int, k: float, R: float) -> (str, str):
+    grayscale_path, binary_path = output_paths(input_path, output_dir)
+
+    color_array = np.array(Image.open(input_path).convert('RGB'))
+    grayscale = convert_to_grayscale(color_array)
+    Image.fromarray(grayscale).save(grayscale_path)
+
+    binary = adaptive_binarization_fast(grayscale, window_size, k, R)
+    Image.fromarray(binary).save(binary_path)
+    return grayscale_path, binary_path
+
+def binarize_batch(source: str, output_dir: str, workers: int = None,
+                   window_size: int = window_size, k: float = k, R: float = R):
+    """
+    Обесцвечивание и WAN-бинаризация всех изображений каталога или glob-шаблона
+    в пуле процессов. Каждый процесс сам записывает результат на диск, генератор
+    выдает (входной файл, выходные файлы) по мере готовности. Файлы, результаты
+    которых новее исходника, пропускаются (выходные файлы = None). Если файл не удалось
+    обработать, вместо выходных файлов выдается исключение, остальные файлы обрабатываются.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pending = []
+    for path in collect_inputs(source):
+        if is_up_to_date(path, output_paths(path, output_dir)):
+            yield path, None
+        else:
+            pending.append(path)
+
+    if not pending:
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(binarize_file, path, output_dir, window_size, k, R): path
+                   for path in pending}
+        for future in as_completed(futures):
+            try:
+                outputs = future.result()
+            except Exception as exc:
+                outputs = exc
+            yield futures[future], outputs
+
+def batch_main(argv=None):
+    parser = argparse.ArgumentParser(description='Пакетная WAN-бинаризация изображений')
+    parser.add_argument('source', help='каталог или glob-шаблон входных изображений')
+    parser.add_argument('output_dir', help='каталог для результатов')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='число процессов')
+    parser.add_argument('--window', type=int, default=window_size)
+    parser.add_argument('-k', type=float, default=k)
+    parser.add_argument('-R', type=float, default=R)
+    args = parser.parse_args(argv)
+
+    done = skipped = failed = 0
+    for path, outputs in binarize_batch(args.source, args.output_dir, args.workers,
+                                        args.window, args.k, args.R):
+        if outputs is None:
+            skipped += 1
+        elif isinstance(outputs, Exception):
+            failed += 1
+            print(f'{path}: ошибка: {outputs}', file=sys.stderr)
+        else:
+            done += 1
+            print(f'{path} -> {outputs[1]}')
+    print(f'Обработано: {done}, пропущено (актуальны): {skipped}, с ошибками: {failed}')
+    return 1 if failed else 0
+
 def main():
     count = 0
     for i in ['book.png', 'fingers.png', 'cat_2.png']:
@@ -58,7 +199,7 @@ def main():
         a = 'grayscale' + '_' + str(count) + '.bmp'
         grayscale_img.save(a)
     
-        binary = adaptive_binarization(grayscale, window_size, k, R) 
+        binary = adaptive_binarization_fast(grayscale, window_size, k, R)
         binary_img = Image.fromarray(binary)
         b = 'binary' + '_' + str(count) + '.bmp'
         binary_img.save(b)
@@ -97,4 +238,7 @@ def main():
     print('Лабораторная работа выполнена.')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        sys.exit(batch_main())
+    else:
+        main()
\ No newline at end of file
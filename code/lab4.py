@@ -1,5 +1,7 @@
 from PIL import Image
 import numpy as np
+import os
+import struct
 
 def convolve(image_array, kernel):
     image_h, image_w = image_array.shape
@@ -18,6 +20,92 @@ def convolve(image_array, kernel):
             output[i, j] = np.sum(window * kernel)
     return output
 
+FFT_MIN_KERNEL_SIZE = 121  # ядра от 11x11 и больше считаются через БПФ
+FFT_BLOCK_ROWS = 256
+
+def separable_factors(kernel, tol=1e-6):
+    """
+    Проверка ранга ядра через SVD. Для ядра ранга 1 возвращает (столбец, строка),
+    такие что kernel = outer(столбец, строка), иначе None.
+    """
+    u, s, vt = np.linalg.svd(np.asarray(kernel, dtype=np.float64))
+    if s[0] == 0 or (len(s) > 1 and s[1] > tol * s[0]):
+        return None
+    scale = np.sqrt(s[0])
+    return (u[:, 0] * scale).astype(np.float32), (vt[0] * scale).astype(np.float32)
+
+def _correlate_separable(padded, column, row, out_shape):
+    # два одномерных прохода: по строкам ядра, затем по столбцам
+    out_h, out_w = out_shape
+    vertical = np.zeros((out_h, padded.shape[1]), dtype=np.float32)
+    for k, coef in enumerate(column):
+        if coef != 0:
+            vertical += coef * padded[k:k + out_h]
+    output = np.zeros(out_shape, dtype=np.float32)
+    for k, coef in enumerate(row):
+        if coef != 0:
+            output += coef * vertical[:, k:k + out_w]
+    return output
+
+def _correlate_fft(padded, kernel, out_shape, block_rows=FFT_BLOCK_ROWS):
+    # overlap-add: свертка блоков строк с отраженным ядром через rfft2,
+    # перекрывающиеся хвосты блоков складываются в результат
+    out_h, out_w = out_shape
+    kernel_h, kernel_w = kernel.shape
+    fft_shape = (block_rows + kernel_h - 1, padded.shape[1] + kernel_w - 1)
+    kernel_spectrum = np.fft.rfft2(kernel[::-1, ::-1], fft_shape)
+
+    output = np.zeros(out_shape, dtype=np.float32)
+    for start in range(0, padded.shape[0], block_rows):
+        block = padded[start:start + block_rows]
+        full = np.fft.irfft2(np.fft.rfft2(block, fft_shape) * kernel_spectrum, fft_shape)
+        full = full[:block.shape[0] + kernel_h - 1, kernel_w - 1:kernel_w - 1 + out_w]
+        # строка full с индексом i соответствует строке результата start + i - (kernel_h - 1)
+        first = start - (kernel_h - 1)
+        lo, hi = max(first, 0), min(first + full.shape[0], out_h)
+        if lo < hi:
+            output[lo:hi] += full[lo - first:hi - first]
+    return output
+
+def _correlate_einsum(padded, kernel, out_shape):
+    windows = np.lib.stride_tricks.sliding_window_view(padded, kernel.shape)
+    return np.einsum('ijkl,kl->ij', windows[:out_shape[0], :out_shape[1]], kernel).astype(np.float32)
+
+def choose_convolution_method(kernel):
+    if separable_factors(kernel) is not None:
+        return 'separable'
+    if kernel.size >= FFT_MIN_KERNEL_SIZE:
+        return 'fft'
+    return 'einsum'
+
+def correlate_valid(padded, kernel, out_shape, method='auto'):
+    """Окна padded размером с ядро для первых out_shape позиций, умноженные на ядро и просуммированные."""
+    kernel = np.asarray(kernel, dtype=np.float32)
+    padded = np.asarray(padded, dtype=np.float32)
+    if method == 'auto':
+        method = choose_convolution_method(kernel)
+    if method == 'separable':
+        factors = separable_factors(kernel)
+        if factors is None:
+            raise ValueError('Ядро не раскладывается в произведение векторов')
+        return _correlate_separable(padded, factors[0], factors[1], out_shape)
+    if method == 'fft':
+        return _correlate_fft(padded, kernel, out_shape)
+    if method == 'einsum':
+        return _correlate_einsum(padded, kernel, out_shape)
+    raise ValueError(f'Неизвестный метод свертки: {method}')
+
+def convolve_fast(image_array, kernel, method='auto'):
+    """
+    То же, что convolve (дополнение нулями, результат float32), но без цикла по пикселям.
+    method: 'auto', 'separable', 'fft' или 'einsum'.
+    """
+    kernel_h, kernel_w = kernel.shape
+    pad_h = kernel_h // 2
+    pad_w = kernel_w // 2
+    padded_image = np.pad(image_array, ((pad_h, pad_h), (pad_w, pad_w)), mode='constant', constant_values=0)
+    return correlate_valid(padded_image, kernel, image_array.shape, method)
+
 def normalize_array(arr):
     """
     norm = (arr - arr_min) / (arr_max - arr_min) * 255 (минимальное становится 0, максимальное - 255)
@@ -27,6 +115,128 @@ def normalize_array(arr):
     norm = (arr - arr_min) / (arr_max - arr_min) * 255
     return norm.astype(np.uint8)
 
+def gradient_strips(gray_array, kernel_gx, kernel_gy, strip_rows=256):
+    """
+    Генератор (y0, y1, Gx, Gy, G) по полосам строк изображения. Для каждой полосы
+    читаются только ее строки плюс ореол в половину ядра, за краями - нули, как в convolve.
+    gray_array может быть любым двумерным массивом, в том числе np.memmap.
+    """
+    height, width = gray_array.shape
+    kernel_h, kernel_w = kernel_gx.shape
+    pad_h = kernel_h // 2
+    pad_w = kernel_w // 2
+    for y0 in range(0, height, strip_rows):
+        y1 = min(y0 + strip_rows, height)
+        top = y0 - pad_h
+        band = np.zeros((y1 - y0 + kernel_h - 1, width + 2 * pad_w), dtype=np.float32)
+        src_lo = max(top, 0)
+        src_hi = min(top + band.shape[0], height)
+        band[src_lo - top:src_hi - top, pad_w:pad_w + width] = gray_array[src_lo:src_hi]
+
+        Gx = correlate_valid(band, kernel_gx, (y1 - y0, width))
+        Gy = correlate_valid(band, kernel_gy, (y1 - y0, width))
+        G = np.sqrt(Gx**2 + Gy**2)
+        yield y0, y1, Gx, Gy, G
+
+def _normalize_with(arr, arr_min, arr_max):
+    # та же формула, что в normalize_array, но с заранее известными min/max
+    norm = (arr - arr_min) / (arr_max - arr_min) * 255
+    return norm.astype(np.uint8)
+
+def detect_edges_strips(gray_array, kernel_gx, kernel_gy, threshold, strip_rows=256, out=None):
+    """
+    Выделение контуров за два прохода по полосам: первый собирает min/max Gx, Gy и G,
+    второй пересчитывает полосу и сразу пишет нормированные Gx, Gy, G и бинарную карту.
+    Полные float-плоскости не хранятся. Результат совпадает с normalize_array(...) и
+    порогом G_norm > threshold.
+    out: необязательный кортеж из четырех uint8-массивов (Gx, Gy, G, G_binary).
+    """
+    lows = [np.float32(np.inf)] * 3
+    highs = [np.float32(-np.inf)] * 3
+    for _, _, *planes in gradient_strips(gray_array, kernel_gx, kernel_gy, strip_rows):
+        for n, plane in enumerate(planes):
+            lows[n] = min(lows[n], plane.min())
+            highs[n] = max(highs[n], plane.max())
+
+    if out is None:
+        out = tuple(np.empty(gray_array.shape, dtype=np.uint8) for _ in range(4))
+    Gx_out, Gy_out, G_out, binary_out = out
+    for y0, y1, *planes in gradient_strips(gray_array, kernel_gx, kernel_gy, strip_rows):
+        for dst, plane, low, high in zip((Gx_out, Gy_out, G_out), planes, lows, highs):
+            dst[y0:y1] = _normalize_with(plane, low, high)
+        binary_out[y0:y1] = np.where(G_out[y0:y1] > threshold, 255, 0)
+    return out
+
+def _bmp_memmap(path):
+    # несжатый 8-битный BMP с градациями серого: строки дополнены до 4 байт,
+    # при положительной высоте хранятся снизу вверх
+    with open(path, "rb") as f:
+        header = f.read(54)
+        if header[:2] != b"BM":
+            raise ValueError(f"{path}: не BMP-файл")
+        offset, = struct.unpack_from("<I", header, 10)
+        dib_size, width, height = struct.unpack_from("<Iii", header, 14)
+        bits, compression = struct.unpack_from("<HI", header, 28)
+        if bits != 8 or compression != 0:
+            raise ValueError(f"{path}: поддерживаются только несжатые 8-битные BMP")
+        colors_used, = struct.unpack_from("<I", header, 46)
+        f.seek(14 + dib_size)
+        palette = np.frombuffer(f.read(4 * (colors_used or 256)), dtype=np.uint8).reshape(-1, 4)
+    if not np.array_equal(palette[:, :3], np.repeat(np.arange(len(palette), dtype=np.uint8)[:, None], 3, axis=1)):
+        raise ValueError(f"{path}: палитра BMP не является градациями серого")
+
+    stride = (width + 3) // 4 * 4
+    rows = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(abs(height), stride))[:, :width]
+    return rows[::-1] if height > 0 else rows
+
+def open_raster(path, shape=None, dtype=np.uint8, offset=0):
+    """
+    Полутоновый растр, отображенный в память без загрузки: .npy через np.load(mmap_mode='r'),
+    .bmp - 8-битный несжатый, остальные файлы считаются сырыми данными формы shape.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return np.load(path, mmap_mode="r")
+    if ext == ".bmp":
+        return _bmp_memmap(path)
+    if shape is None:
+        raise ValueError("Для сырого растра нужно указать shape")
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+def detect_edges_memmap(raster, output_dir, kernel_gx, kernel_gy, threshold, band_rows=256):
+    """
+    Выделение контуров для растров больше оперативной памяти. Оператор применяется
+    к перекрывающимся полосам строк (ореол в половину ядра), Gx, Gy, G (float32) и
+    бинарная карта (uint8) пишутся в .npy-файлы, отображенные в память.
+    Бинаризация, как и в основном сценарии, делается по нормированному G.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    shape = raster.shape
+
+    def open_output(name, dtype):
+        return np.lib.format.open_memmap(os.path.join(output_dir, name), mode="w+", dtype=dtype, shape=shape)
+
+    Gx_out = open_output("Gx.npy", np.float32)
+    Gy_out = open_output("Gy.npy", np.float32)
+    G_out = open_output("G.npy", np.float32)
+    binary_out = open_output("G_binary.npy", np.uint8)
+
+    G_min, G_max = np.float32(np.inf), np.float32(-np.inf)
+    for y0, y1, Gx, Gy, G in gradient_strips(raster, kernel_gx, kernel_gy, band_rows):
+        Gx_out[y0:y1] = Gx
+        Gy_out[y0:y1] = Gy
+        G_out[y0:y1] = G
+        G_min, G_max = min(G_min, G.min()), max(G_max, G.max())
+
+    for y0 in range(0, shape[0], band_rows):
+        y1 = min(y0 + band_rows, shape[0])
+        G_norm = _normalize_with(G_out[y0:y1], G_min, G_max)
+        binary_out[y0:y1] = np.where(G_norm > threshold, 255, 0)
+
+    for out in (Gx_out, Gy_out, G_out, binary_out):
+        out.flush()
+    return Gx_out, Gy_out, G_out, binary_out
+
 kernel_Gx = np.array([
     [-1, -1, -1, -1, -1],
     [ 0,  0,  0,  0,  0],
@@ -53,22 +263,14 @@ gray_img.save("grayscale.png")
 gray_array = np.array(gray_img, dtype=np.float32)
 
 
-Gx = convolve(gray_array, kernel_Gx)
-Gx_norm = normalize_array(Gx)  
-
-Gy = convolve(gray_array, kernel_Gy)
-Gy_norm = normalize_array(Gy)
+threshold = 25
 
-# G = sqrt(Gx^2 + Gy^2)
-G = np.sqrt(Gx**2 + Gy**2)
-G_norm = normalize_array(G)
+# Gx, Gy, G = sqrt(Gx^2 + Gy^2) и бинаризация G по полосам строк
+Gx_norm, Gy_norm, G_norm, G_binary = detect_edges_strips(gray_array, kernel_Gx, kernel_Gy, threshold)
 
 Image.fromarray(Gx_norm).save("Gx.png")
 Image.fromarray(Gy_norm).save("Gy.png")
 Image.fromarray(G_norm).save("G.png")
-
-threshold = 25
-G_binary = np.where(G_norm > threshold, 255, 0).astype(np.uint8)
 Image.fromarray(G_binary).save("G_binary.png")
 
 markdown_text = f"""# Лабораторная работа No4: Выделение контуров на изображении
@@ -1,9 +1,12 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import numpy as np
-import matplotlib.pyplot as plt
 import csv
 import os
 
+from glyph_cache import get_glyph
+from glyph_features import batch_moments, stack_glyphs
+from plot_render import profile_chart, render_plots
+
 
 font_path = "Noto_Sans_Ugaritic/NotoSansUgaritic-Regular.ttf" 
 font_size = 52
@@ -17,12 +20,8 @@ output_folder = "symbols"
 if not os.path.exists(output_folder):
     os.makedirs(output_folder)
 
-font = ImageFont.truetype(font_path, font_size)
 for i, char in enumerate(chars):
-    image = Image.new("L", (font_size * 2, font_size * 2), 255) 
-    draw = ImageDraw.Draw(image)
-    draw.text((10, 10), char, font=font, fill=0) 
-    image = image.crop(image.getbbox())
+    image = Image.fromarray(get_glyph(char, font_path, font_size, margin=10, crop=True))
     image.save(f"{output_folder}/symbol_{i}.png") 
 
 def calculate_features(image):
@@ -65,6 +64,35 @@ def calculate_features(image):
         "x_profile": x_profile, "y_profile": y_profile
     }
 
+def calculate_features_batch(images):
+    """Те же признаки, что calculate_features, но для всех изображений сразу."""
+    stack, sizes = stack_glyphs([np.array(image) == 0 for image in images])
+    moments = batch_moments(stack, sizes)
+
+    features = []
+    for g, (h, w) in enumerate(sizes.tolist()):
+        area = (h * w) / 4
+        weights = list(moments["weights"][g])
+        x_c, y_c = moments["x_c"][g], moments["y_c"][g]
+        I_x, I_y = moments["I_x"][g], moments["I_y"][g]
+        if moments["mass"][g] == 0:
+            # как в calculate_features: сумма по пустому набору пикселей равна 0, а не nan
+            I_x = I_y = 0.0
+        features.append({
+            "weights": weights,
+            "specific_weights": [w / area for w in weights],
+            "x_c": x_c, "y_c": y_c,
+            "x_norm": x_c / w, "y_norm": y_c / h,
+            "I_x": I_x, "I_y": I_y,
+            "I_x_norm": I_x / (h * w), "I_y_norm": I_y / (h * w),
+            "x_profile": moments["x_profile"][g, :w], "y_profile": moments["y_profile"][g, :h]
+        })
+    return features
+
+images = [Image.open(f"{output_folder}/symbol_{i}.png").convert("L") for i in range(len(chars))]
+all_features = calculate_features_batch(images)
+plot_jobs = []
+
 with open("features.csv", "w", newline="") as csvfile:
     writer = csv.writer(csvfile, delimiter=";")
     writer.writerow(["Символ", "Вес_1", "Вес_2", "Вес_3", "Вес_4",
@@ -75,22 +103,16 @@ with open("features.csv", "w", newline="") as csvfile:
         report_file.write("# Лабораторная работа №5. Выделение признаков символов\n\n")
 
         for i, char in enumerate(chars):
-            image = Image.open(f"{output_folder}/symbol_{i}.png").convert("L")
-            features = calculate_features(image)
+            features = all_features[i]
 
             writer.writerow([char, *features["weights"], *features["specific_weights"],
                              features["x_c"], features["y_c"], features["x_norm"], features["y_norm"],
                              features["I_x"], features["I_y"], features["I_x_norm"], features["I_y_norm"]])
 
-            plt.bar(range(len(features["x_profile"])), features["x_profile"])
-            plt.title(f"X Profile for {char}")
-            plt.savefig(f"{output_folder}/symbol_{i}_x_profile.png")
-            plt.clf()
-
-            plt.bar(range(len(features["y_profile"])), features["y_profile"])
-            plt.title(f"Y Profile for {char}")
-            plt.savefig(f"{output_folder}/symbol_{i}_y_profile.png")
-            plt.clf()
+            plot_jobs.append(profile_chart(f"{output_folder}/symbol_{i}_x_profile.png",
+                                           [("bar", features["x_profile"], f"X Profile for {char}")]))
+            plot_jobs.append(profile_chart(f"{output_folder}/symbol_{i}_y_profile.png",
+                                           [("bar", features["y_profile"], f"Y Profile for {char}")]))
 
             report_file.write(f"## Символ {char}\n\n")
             report_file.write(f"![Изображение]({output_folder}/symbol_{i}.png)\n\n")
@@ -105,4 +127,7 @@ with open("features.csv", "w", newline="") as csvfile:
             report_file.write(f"- Моменты инерции: (X: {features['I_x']:.2f}, Y: {features['I_y']:.2f})\n")
             report_file.write(f"- Нормированные моменты инерции: (X: {features['I_x_norm']:.4f}, Y: {features['I_y_norm']:.4f})\n\n")
 
+# графики профилей рисуются после расчета признаков, параллельно
+render_plots(plot_jobs, manifest_path=f"{output_folder}/.plot_hashes.json")
+
 print("Обработка завершена. Результаты сохранены в файлы features.csv и report_5.md.")
\ No newline at end of file
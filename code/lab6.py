@@ -1,8 +1,11 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 
+from glyph_cache import get_glyph
+from plot_render import profile_chart, render_plots
+from segmentation import find_runs, segment_page
+
 
 font_path = "Noto_Sans_Ugaritic/NotoSansUgaritic-Regular.ttf"
 font_size = 52
@@ -10,8 +13,6 @@ phrase = "𐎀𐎁𐎂 𐎃𐎄𐎅"
 chars = ["𐎀", "𐎁", "𐎂", "𐎃", "𐎄", "𐎅", "𐎆", "𐎇", "𐎈", "𐎉"]
 
 
-font = ImageFont.truetype(font_path, font_size)
-
 
 png_image_path = "text.png" 
 bmp_image_path = "phrase.bmp"  
@@ -32,38 +33,20 @@ image = Image.open("phrase.bmp").convert("L")
 v_profile, h_profile = calculate_profiles(image)
 
 
-plt.figure(figsize=(12, 6))
-plt.subplot(1, 2, 1)
-plt.bar(range(len(v_profile)), v_profile)
-plt.title("Вертикальный профиль")
-plt.subplot(1, 2, 2)
-plt.barh(range(len(h_profile)), h_profile)
-plt.title("Горизонтальный профиль")
-plt.savefig("profiles.png")
-plt.close()
+plot_jobs = [profile_chart("profiles.png", [("bar", v_profile, "Вертикальный профиль"),
+                                             ("barh", h_profile, "Горизонтальный профиль")], figsize=(12, 6))]
 
 
 def segment_characters(image, threshold=2):
     data = np.array(image)
     v_profile = np.sum(data == 0, axis=0) 
     
-    in_char = False
-    start_pos = []
-    end_pos = []
-    
-    for i, val in enumerate(v_profile):
-        if val > threshold and not in_char:
-            start_pos.append(i)
-            in_char = True
-        elif val <= threshold and in_char:
-            end_pos.append(i)
-            in_char = False
-    
-    if in_char:
-        end_pos.append(len(v_profile)-1)
+    start_pos, end_pos = find_runs(v_profile > threshold)
+    if len(end_pos) and end_pos[-1] == len(v_profile):
+        end_pos[-1] = len(v_profile) - 1
     
     bboxes = []
-    for start, end in zip(start_pos, end_pos):
+    for start, end in zip(start_pos.tolist(), end_pos.tolist()):
         char_slice = data[:, start:end]
         h_profile = np.sum(char_slice == 0, axis=1)
         top = np.argmax(h_profile > 0) 
@@ -74,6 +57,9 @@ def segment_characters(image, threshold=2):
 
 
 bboxes = segment_characters(image)
+# сегментация всей страницы (строки, затем символы) и связными компонентами
+page_boxes = segment_page(image)
+component_boxes = segment_page(image, mode="components")
 
 
 result = image.copy().convert("RGB")
@@ -86,23 +72,17 @@ if not os.path.exists("symbol_profiles"):
     os.makedirs("symbol_profiles")
 
 for i, char in enumerate(chars):
-    char_image = Image.new("L", (font_size*2, font_size*2), 255)
-    draw = ImageDraw.Draw(char_image)
-    draw.text((10, 10), char, font=font, fill=0)
-    char_image = char_image.crop(char_image.getbbox())  
+    char_image = Image.fromarray(get_glyph(char, font_path, font_size, margin=10, crop=True))
     
     v_profile, h_profile = calculate_profiles(char_image)
     
-    plt.figure(figsize=(8, 4))
-    plt.subplot(1, 2, 1)
-    plt.bar(range(len(v_profile)), v_profile)
-    plt.title(f"Vertical profile {i}") 
-    plt.subplot(1, 2, 2)
-    plt.barh(range(len(h_profile)), h_profile)
-    plt.title(f"Horizontal profile {i}")
-    plt.tight_layout()
-    plt.savefig(f"symbol_profiles/profile_{i}.png")
-    plt.close()
+    plot_jobs.append(profile_chart(f"symbol_profiles/profile_{i}.png",
+                                   [("bar", v_profile, f"Vertical profile {i}"),
+                                    ("barh", h_profile, f"Horizontal profile {i}")],
+                                   figsize=(8, 4), tight_layout=True))
+
+# все графики рисуются после сбора профилей, параллельно
+render_plots(plot_jobs, manifest_path=".plot_hashes.json")
 
 with open("lab_6_.md", "w", encoding="utf-8") as report:
     report.write("# Лабораторная работа №6: Сегментация текста\n\n")
@@ -119,6 +99,9 @@ with open("lab_6_.md", "w", encoding="utf-8") as report:
     for i, bbox in enumerate(bboxes):
         report.write(f"- Символ {i+1}: {bbox}\n")
     report.write("\n")
+    report.write(f"Сегментация страницы по профилям: {len(page_boxes)} символов "
+                 f"в {len(np.unique(page_boxes['line']))} строках, "
+                 f"по связным компонентам: {len(component_boxes)} символов\n\n")
     
     report.write("## 4. Профили символов алфавита\n")
     for i, char in enumerate(chars):
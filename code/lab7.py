@@ -1,7 +1,12 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageFont
 import numpy as np
+import hashlib
+import inspect
 import os
 
+from glyph_cache import DEFAULT_CACHE_DIR, font_file_hash, get_glyph
+from glyph_features import batch_moments, stack_glyphs
+
 font_path = "Noto_Sans_Ugaritic/NotoSansUgaritic-Regular.ttf"
 default_font_size = 52
 alphabet_chars = [
@@ -12,21 +17,18 @@ alphabet_chars = [
 
 
 def generate_char_image(char, font, margin=10):
-
-    dummy_img = Image.new("L", (1, 1), 255)
-    draw = ImageDraw.Draw(dummy_img)
-    
-    bbox = draw.textbbox((0, 0), char, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
-    
-    width = text_width + 2 * margin
-    height = text_height + 2 * margin
-    img = Image.new("L", (width, height), 255)
-    draw = ImageDraw.Draw(img)
-    
-    draw.text((margin, margin), char, font=font, fill=0)
-    return img
+    # растр берется из общего кэша, FreeType вызывается только при промахе
+    return Image.fromarray(get_glyph(char, font.path, font.size, margin))
+
+def tight_glyph(image, margin=10, threshold=128):
+    """Символ, обрезанный по рамке пикселей темнее threshold, с белыми полями margin."""
+    arr = np.asarray(image)
+    ink = arr < threshold
+    if ink.any():
+        rows = np.flatnonzero(ink.any(axis=1))
+        cols = np.flatnonzero(ink.any(axis=0))
+        arr = arr[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    return np.pad(arr, margin, mode="constant", constant_values=255)
 
 def compute_features(image, threshold=128):
     arr = np.array(image)
@@ -54,6 +56,26 @@ def compute_features(image, threshold=128):
     
     return np.array([mass_norm, center_x, center_y, moment_x, moment_y])
 
+def compute_features_batch(images, threshold=128):
+    """compute_features для набора изображений: матрица (N x 5) по сырым моментам масок."""
+    stack, sizes = stack_glyphs([np.array(image) < threshold for image in images])
+    moments = batch_moments(stack, sizes)
+    h = sizes[:, 0].astype(np.float64)
+    w = sizes[:, 1].astype(np.float64)
+    mass = moments["mass"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_c, y_c = moments["x_c"], moments["y_c"]
+        features = np.stack([
+            mass / (w * h),
+            x_c / w,
+            y_c / h,
+            moments["I_y"] / mass / w**2,
+            moments["I_x"] / mass / h**2,
+        ], axis=1)
+    features[mass == 0] = 0
+    return features
+
 def closeness_measure(feat1, feat2):
     distance = np.linalg.norm(feat1 - feat2)
     return 1 / (1 + distance)
@@ -66,24 +88,110 @@ def build_templates(font):
         templates[char] = features
     return templates
 
-def recognize_text(text_to_recognize, font):
-    templates = build_templates(font)
-    hypotheses = []
-    best_chars = []
-    
-    for char in text_to_recognize:
-        img = generate_char_image(char, font)
-        feat = compute_features(img)
-        curr_hypotheses = []
-        
-        for tmpl_char, tmpl_feat in templates.items():
-            measure = closeness_measure(feat, tmpl_feat)
-            curr_hypotheses.append((tmpl_char, measure))
-        
-        curr_hypotheses.sort(key=lambda x: x[1], reverse=True)
-        hypotheses.append(curr_hypotheses)
-        best_chars.append(curr_hypotheses[0][0])
-    
+def feature_definition_hash():
+    # меняется при любом изменении кода вычисления признаков
+    source = "".join(inspect.getsource(fn) for fn in (compute_features, compute_features_batch, batch_moments, tight_glyph))
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+class TemplateIndex:
+    """
+    Признаки эталонных символов для одного шрифта и размера: непрерывная матрица
+    float32 (n_templates x n_features) и список символов в том же порядке.
+    Строится один раз и сохраняется в cache_dir; загружается лениво при первом
+    обращении и перестраивается, если изменился файл шрифта или compute_features.
+    tight=True - эталоны обрезаются по символу (tight_glyph), как фрагменты страницы.
+    """
+
+    def __init__(self, font_path, font_size, chars=None, margin=10, cache_dir=DEFAULT_CACHE_DIR, tight=False):
+        self.font_path = font_path
+        self.font_size = font_size
+        self.template_chars = list(alphabet_chars if chars is None else chars)
+        self.margin = margin
+        self.tight = tight
+        self.cache_dir = cache_dir
+        self._chars = None
+        self._features = None
+
+    def _signature(self):
+        return "|".join([font_file_hash(self.font_path), str(self.font_size), str(self.margin),
+                         str(self.tight), feature_definition_hash(), "".join(self.template_chars)])
+
+    @property
+    def path(self):
+        suffix = "_tight" if self.tight else ""
+        name = f"templates_{font_file_hash(self.font_path)}_{self.font_size}_{self.margin}{suffix}.npz"
+        return os.path.join(self.cache_dir, name)
+
+    def _load(self):
+        if self._features is not None:
+            return
+        signature = self._signature()
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                if str(data["signature"]) == signature:
+                    self._chars = [str(c) for c in data["chars"]]
+                    self._features = np.ascontiguousarray(data["features"], dtype=np.float32)
+                    return
+        self.build()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.savez(self.path, signature=signature, chars=np.array(self._chars), features=self._features)
+
+    def build(self):
+        glyphs = [get_glyph(char, self.font_path, self.font_size, self.margin) for char in self.template_chars]
+        if self.tight:
+            glyphs = [tight_glyph(glyph, self.margin) for glyph in glyphs]
+        features = compute_features_batch(glyphs)
+        self._chars = list(self.template_chars)
+        self._features = np.ascontiguousarray(features, dtype=np.float32)
+
+    @property
+    def chars(self):
+        self._load()
+        return self._chars
+
+    @property
+    def features(self):
+        self._load()
+        return self._features
+
+_template_indexes = {}
+
+def get_template_index(font, margin=10, tight=False):
+    key = (os.path.abspath(font.path), font.size, margin, tight, font_file_hash(font.path))
+    if key not in _template_indexes:
+        _template_indexes[key] = TemplateIndex(font.path, font.size, margin=margin, tight=tight)
+    return _template_indexes[key]
+
+def classify_features(features, index, top_k=5):
+    """
+    Пакетная классификация: features - матрица (N x F) признаков символов строки.
+    Все расстояния до эталонов считаются одной операцией, k лучших гипотез
+    выбираются через argpartition. Возвращает индексы эталонов и меры близости
+    1 / (1 + d), обе формы (N x k), по убыванию близости.
+    """
+    templates = index.features
+    n_templates = templates.shape[0]
+    features = np.asarray(features).reshape(-1, templates.shape[1])
+    distances = np.linalg.norm(features[:, None, :] - templates[None, :, :], axis=-1)
+
+    k = n_templates if top_k is None else min(top_k, n_templates)
+    if k < n_templates:
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n_templates), distances.shape)
+    order = np.argsort(np.take_along_axis(distances, candidates, axis=1), axis=1, kind="stable")
+    best = np.take_along_axis(candidates, order, axis=1)
+    scores = 1 / (1 + np.take_along_axis(distances, best, axis=1))
+    return best, scores
+
+def recognize_text(text_to_recognize, font, top_k=5):
+    index = get_template_index(font)
+    features = compute_features_batch([generate_char_image(char, font) for char in text_to_recognize])
+    best, scores = classify_features(features, index, top_k)
+
+    hypotheses = [[(index.chars[j], float(score)) for j, score in zip(row, row_scores)]
+                  for row, row_scores in zip(best, scores)]
+    best_chars = [curr_hypotheses[0][0] for curr_hypotheses in hypotheses]
     return hypotheses, "".join(best_chars)
 
 def write_results_to_file(filename, hypotheses, true_text, best_text, error_count, percent_ok, experiment_results):
@@ -1,6 +1,8 @@
 from PIL import Image, ImageOps
 import numpy as np
 import math
+import time
+import weakref
 import matplotlib.pyplot as plt
 
 def rgb_to_hsl(image):
@@ -23,6 +25,57 @@ def power_transform(l_channel, gamma=1.0):
     l_transformed = np.power(l_array, gamma) * 255.0
     return Image.fromarray(l_transformed.astype(np.uint8))
 
+def tone_curve_lut(kind="gamma", gamma=1.0, points=None):
+    """
+    Таблица на 256 значений для тоновой кривой:
+    'gamma' - степенное преобразование (те же значения, что power_transform),
+    'log' - логарифмическое 255 * log(1 + v) / log(256),
+    'piecewise' - кусочно-линейная кривая по точкам points [(вход, выход), ...] в диапазоне 0..255.
+    """
+    if kind == "gamma":
+        curve = np.power(np.arange(256, dtype=np.float32) / 255.0, gamma) * 255.0
+    elif kind == "log":
+        curve = 255.0 * np.log1p(np.arange(256)) / np.log(256.0)
+    elif kind == "piecewise":
+        xs, ys = zip(*sorted(points))
+        curve = np.interp(np.arange(256), xs, ys)
+    else:
+        raise ValueError(f"Неизвестная тоновая кривая: {kind}")
+    return np.clip(curve, 0, 255).astype(np.uint8)
+
+def to_hsv_array(image):
+    # один изменяемый uint8-буфер (H, W, 3) вместо трех отдельных каналов PIL
+    return np.array(rgb_to_hsl(image))
+
+def hsv_array_to_rgb(hsv_array):
+    height, width = hsv_array.shape[:2]
+    hsv_image = Image.frombuffer("HSV", (width, height), np.ascontiguousarray(hsv_array), "raw", "HSV", 0, 1)
+    return hsl_to_rgb(hsv_image)
+
+def apply_tone_curve(hsv_array, lut, source=None):
+    """
+    Применение таблицы lut к каналу V буфера hsv_array на месте через np.take.
+    source - необязательный исходный канал V (для серии кривых по одному изображению).
+    """
+    v_plane = hsv_array[..., 2]
+    np.take(lut, v_plane if source is None else source, out=v_plane)
+    return hsv_array
+
+def adjust_contrast_batch(images, lut):
+    """Генератор RGB-изображений с тоновой кривой lut, примененной к яркости V."""
+    for image in images:
+        yield hsv_array_to_rgb(apply_tone_curve(to_hsv_array(image), lut))
+
+def gamma_sweep(image, gammas):
+    """Серия гамма-коррекций одного изображения: перевод в HSV выполняется один раз."""
+    hsv_array = to_hsv_array(image)
+    v_original = hsv_array[..., 2].copy()
+    results = {}
+    for gamma in gammas:
+        apply_tone_curve(hsv_array, tone_curve_lut("gamma", gamma), source=v_original)
+        results[gamma] = hsv_array_to_rgb(hsv_array)
+    return results
+
 def calculate_ngldm(image_array, d=1, levels=256):
     height, width = image_array.shape
     ngldm = np.zeros(levels, dtype=np.float32)
@@ -41,29 +94,223 @@ def calculate_ngldm(image_array, d=1, levels=256):
                             neighbors.append(image_array[ny, nx])
             
             if neighbors:
-                avg_diff = np.mean(np.abs(current_val - np.array(neighbors)))
+                avg_diff = np.mean(np.abs(int(current_val) - np.array(neighbors, dtype=np.int64)))
                 ngldm[current_val] += avg_diff
     
     return ngldm
 
+def ngldm_offsets(d):
+    # ромбовидная окрестность |dy| + |dx| <= d без центра
+    return [(dy, dx) for dy in range(-d, d + 1) for dx in range(-d, d + 1)
+            if abs(dy) + abs(dx) <= d and (dy != 0 or dx != 0)]
+
+def neighbour_differences(image_array, offsets):
+    """
+    Для каждого пикселя сумма |центр - сосед| по смещениям offsets и число соседей,
+    попавших в изображение. Считается по сдвинутым срезам дополненного массива.
+    """
+    values = image_array.astype(np.int32)
+    height, width = values.shape
+    r = max(max(abs(dy), abs(dx)) for dy, dx in offsets)
+    padded = np.pad(values, r)
+    inside = np.pad(np.ones((height, width), dtype=bool), r)
+
+    diff_sum = np.zeros((height, width), dtype=np.int32)
+    counts = np.zeros((height, width), dtype=np.int32)
+    for dy, dx in offsets:
+        window = (slice(r + dy, r + dy + height), slice(r + dx, r + dx + width))
+        valid = inside[window]
+        diff_sum += np.abs(values - padded[window]) * valid
+        counts += valid
+    return diff_sum, counts
+
+def calculate_ngldm_fast(image_array, d=1, levels=256):
+    """То же, что calculate_ngldm, без циклов по пикселям."""
+    diff_sum, counts = neighbour_differences(image_array, ngldm_offsets(d))
+    has_neighbours = counts > 0
+    avg_diff = diff_sum[has_neighbours] / counts[has_neighbours]
+    ngldm = np.bincount(image_array[has_neighbours], weights=avg_diff, minlength=levels)
+    return ngldm.astype(np.float32)
+
+def benchmark_ngldm(image_array, d=2, crop_size=128, repeats=3):
+    """Сравнение calculate_ngldm_fast с попиксельной calculate_ngldm на фрагменте изображения."""
+    sample = image_array[:crop_size, :crop_size]
+
+    start = time.perf_counter()
+    reference = calculate_ngldm(sample, d)
+    loop_time = time.perf_counter() - start
+
+    fast_time = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = calculate_ngldm_fast(sample, d)
+        fast_time = min(fast_time, time.perf_counter() - start)
+
+    matches = np.allclose(reference, result, rtol=1e-5)
+    print(f"NGLDM d={d}: циклы {loop_time:.4f} c, numpy {fast_time:.4f} c, "
+          f"ускорение x{loop_time / fast_time:.1f}, совпадение: {matches}")
+    return loop_time, fast_time, matches
+
+def quantize_levels(image_array, levels=256):
+    # 0..255 -> 0..levels-1 равными интервалами
+    values = image_array.astype(np.int32)
+    if levels == 256:
+        return values
+    return (values * levels) >> 8
+
+def calculate_ngldm_multi(image_array, distances, levels=256):
+    """
+    NGLDM сразу для нескольких радиусов d по изображению, квантованному в levels уровней.
+    Окрестности обходятся кольцами |dy| + |dx| = r от 1 до max(distances): суммы
+    разностей и число соседей накапливаются (int64), так что радиус d переиспользует
+    все внутренние кольца. Возвращает матрицу (len(distances) x levels).
+    """
+    values = quantize_levels(image_array, levels)
+    distances = list(distances)
+    height, width = values.shape
+    diff_sum = np.zeros((height, width), dtype=np.int64)
+    counts = np.zeros((height, width), dtype=np.int64)
+    ngldm = np.zeros((len(distances), levels), dtype=np.float64)
+
+    for r in range(1, max(distances) + 1):
+        ring = [(dy, dx) for dy, dx in ngldm_offsets(r) if abs(dy) + abs(dx) == r]
+        ring_sum, ring_counts = neighbour_differences(values, ring)
+        diff_sum += ring_sum
+        counts += ring_counts
+        for n, d in enumerate(distances):
+            if d == r:
+                has_neighbours = counts > 0
+                avg_diff = diff_sum[has_neighbours] / counts[has_neighbours]
+                ngldm[n] = np.bincount(values[has_neighbours], weights=avg_diff, minlength=levels)
+    return ngldm
+
 def calculate_sne(ngldm):
-    total = np.sum(ngldm)
-    if total == 0:
-        return 0
-    k = np.arange(len(ngldm))
-    sne = np.sum(ngldm[1:] / (k[1:]**2 + 1e-6)) / total  
-    return sne
+    # ngldm может быть матрицей (n_d x levels): признак считается по каждой строке
+    ngldm = np.asarray(ngldm)
+    total = np.sum(ngldm, axis=-1)
+    k = np.arange(ngldm.shape[-1])
+    sne = np.sum(ngldm[..., 1:] / (k[1:]**2 + 1e-6), axis=-1)
+    if ngldm.ndim == 1:
+        return 0 if total == 0 else sne / total
+    return np.divide(sne, total, out=np.zeros_like(sne, dtype=np.float64), where=total != 0)
 
 def calculate_lne(ngldm):
-    total = np.sum(ngldm)
-    if total == 0:
-        return 0
-    k = np.arange(len(ngldm))
-    lne = np.sum(ngldm[1:] * k[1:]**2) / total 
-    return lne
-
-def plot_histogram(image_array, title, ax):
-    ax.hist(image_array.flatten(), bins=256, range=(0, 255), color='gray', alpha=0.7)
+    ngldm = np.asarray(ngldm)
+    total = np.sum(ngldm, axis=-1)
+    k = np.arange(ngldm.shape[-1])
+    lne = np.sum(ngldm[..., 1:] * k[1:]**2, axis=-1)
+    if ngldm.ndim == 1:
+        return 0 if total == 0 else lne / total
+    return np.divide(lne, total, out=np.zeros_like(lne, dtype=np.float64), where=total != 0)
+
+def local_texture_maps(image_array, window, stride, d=1, levels=256):
+    """
+    Карты SNE и LNE для всех окон window x window с шагом stride.
+    Вклад каждого пикселя (уровень яркости и средняя разность с соседями в радиусе d)
+    считается один раз по всему изображению. Гистограммы столбцов текущей полосы
+    обновляются при сдвиге полосы вниз (входящие строки добавляются, уходящие
+    вычитаются), гистограмма окна так же обновляется при сдвиге вдоль строки.
+    Возвращает две карты формы (число окон по Y, число окон по X).
+    """
+    values = quantize_levels(image_array, levels)
+    diff_sum, counts = neighbour_differences(values, ngldm_offsets(d))
+    weights = diff_sum / np.maximum(counts, 1)
+    height, width = values.shape
+    n_rows = max((height - window) // stride + 1, 0)
+    n_cols = max((width - window) // stride + 1, 0)
+    sne_map = np.zeros((n_rows, n_cols))
+    lne_map = np.zeros((n_rows, n_cols))
+    if n_rows == 0 or n_cols == 0:
+        return sne_map, lne_map
+
+    # гистограммы NGLDM каждого столбца в пределах полосы строк
+    bins = np.arange(width) * levels + values
+    column_hist = np.zeros((width, levels))
+
+    def update_columns(r0, r1, sign):
+        if r0 < r1:
+            hist = np.bincount(bins[r0:r1].ravel(), weights=weights[r0:r1].ravel(), minlength=width * levels)
+            column_hist[...] += sign * hist.reshape(width, levels)
+
+    update_columns(0, window, 1)
+    for i in range(n_rows):
+        if i > 0:
+            y0, prev = i * stride, (i - 1) * stride
+            update_columns(max(prev + window, y0), y0 + window, 1)
+            update_columns(prev, min(prev + window, y0), -1)
+
+        tiles = np.empty((n_cols, levels))
+        hist = column_hist[:window].sum(axis=0)
+        tiles[0] = hist
+        for j in range(1, n_cols):
+            x0, prev = j * stride, (j - 1) * stride
+            hist += column_hist[max(prev + window, x0):x0 + window].sum(axis=0)
+            hist -= column_hist[prev:min(prev + window, x0)].sum(axis=0)
+            tiles[j] = hist
+        # вычитание может дать -1e-12 вместо нуля
+        np.maximum(tiles, 0, out=tiles)
+        sne_map[i] = calculate_sne(tiles)
+        lne_map[i] = calculate_lne(tiles)
+    return sne_map, lne_map
+
+class HistogramCache:
+    """
+    256-бинные гистограммы изображений, посчитанные один раз через np.bincount
+    и сохраненные по (массив, канал). Запись удаляется, когда массив уничтожен;
+    массив не должен изменяться после подсчета. Статистики (среднее, процентили,
+    энтропия, CDF, таблица эквализации) читаются из гистограммы без прохода по пикселям.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._tracked = set()
+
+    def _forget(self, array_id):
+        self._tracked.discard(array_id)
+        for key in [key for key in self._counts if key[0] == array_id]:
+            del self._counts[key]
+
+    def counts(self, image_array, channel=None):
+        key = (id(image_array), channel)
+        if key not in self._counts:
+            if key[0] not in self._tracked:
+                weakref.finalize(image_array, self._forget, key[0])
+                self._tracked.add(key[0])
+            data = image_array if channel is None else image_array[..., channel]
+            self._counts[key] = np.bincount(np.ravel(data), minlength=256)
+        return self._counts[key]
+
+    def cdf(self, image_array, channel=None):
+        counts = self.counts(image_array, channel)
+        return np.cumsum(counts) / counts.sum()
+
+    def mean(self, image_array, channel=None):
+        counts = self.counts(image_array, channel)
+        return counts @ np.arange(len(counts)) / counts.sum()
+
+    def percentile(self, image_array, q, channel=None):
+        # наименьший уровень, у которого доля пикселей не выше него >= q%
+        return np.searchsorted(self.cdf(image_array, channel), np.asarray(q) / 100.0, side='left')
+
+    def entropy(self, image_array, channel=None):
+        counts = self.counts(image_array, channel)
+        p = counts[counts > 0] / counts.sum()
+        return -np.sum(p * np.log2(p))
+
+    def equalization_lut(self, image_array, channel=None):
+        cdf = self.cdf(image_array, channel)
+        cdf_min = cdf[np.flatnonzero(cdf)[0]]
+        if cdf_min == 1:
+            return np.arange(256, dtype=np.uint8)
+        return np.clip(np.round((cdf - cdf_min) / (1 - cdf_min) * 255), 0, 255).astype(np.uint8)
+
+histograms = HistogramCache()
+
+def plot_histogram(image_array, title, ax, cache=histograms):
+    # те же 256 интервалов на [0, 255], что и ax.hist(bins=256, range=(0, 255))
+    counts = cache.counts(image_array)
+    edges = np.linspace(0, 255, 257)
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color='gray', alpha=0.7)
     ax.set_title(title)
     ax.set_xlim(0, 255)
 
@@ -71,20 +318,27 @@ def main():
     image_path = "your_image.jpg"
     original_image = Image.open(image_path)
 
-    hsl_image = rgb_to_hsl(original_image)
-    h_channel, s_channel, l_channel = hsl_image.split()
-    l_array = np.array(l_channel)
+    hsv_array = to_hsv_array(original_image)
+    l_array = hsv_array[..., 2].copy()
     
     gamma = 0.5 
-    l_transformed = power_transform(l_channel, gamma)
-    l_transformed_array = np.array(l_transformed)
+    apply_tone_curve(hsv_array, tone_curve_lut("gamma", gamma))
+    l_transformed_array = hsv_array[..., 2]
 
-    transformed_hsl = combine_hsl(h_channel, s_channel, l_transformed)
-    transformed_image = hsl_to_rgb(transformed_hsl)
+    transformed_image = hsv_array_to_rgb(hsv_array)
 
     d = 2  
-    ngldm_original = calculate_ngldm(l_array, d)
-    ngldm_transformed = calculate_ngldm(l_transformed_array, d)
+    ngldm_original = calculate_ngldm_fast(l_array, d)
+    ngldm_transformed = calculate_ngldm_fast(l_transformed_array, d)
+    benchmark_ngldm(l_array, d)
+
+    # многомасштабные признаки: несколько радиусов за один обход, 32 уровня яркости
+    distances = [1, 2, 3]
+    multi_levels = 32
+    multi_original = calculate_ngldm_multi(l_array, distances, multi_levels)
+    multi_transformed = calculate_ngldm_multi(l_transformed_array, distances, multi_levels)
+    multi_sne = (calculate_sne(multi_original), calculate_sne(multi_transformed))
+    multi_lne = (calculate_lne(multi_original), calculate_lne(multi_transformed))
 
     sne_original = calculate_sne(ngldm_original)
     lne_original = calculate_lne(ngldm_original)
@@ -101,11 +355,11 @@ def main():
     axes[0, 1].set_title(f"Transformed Image (γ={gamma})")
     axes[0, 1].axis('off')
 
-    axes[1, 0].imshow(l_channel, cmap='gray')
+    axes[1, 0].imshow(l_array, cmap='gray')
     axes[1, 0].set_title("Original L Channel")
     axes[1, 0].axis('off')
     
-    axes[1, 1].imshow(l_transformed, cmap='gray')
+    axes[1, 1].imshow(l_transformed_array, cmap='gray')
     axes[1, 1].set_title(f"Transformed L Channel (γ={gamma})")
     axes[1, 1].axis('off')
 
@@ -114,6 +368,15 @@ def main():
     
     plt.tight_layout()
 
+    # локальные текстурные карты: окно 32x32 с шагом 16
+    sne_map, lne_map = local_texture_maps(l_array, window=32, stride=16, d=d)
+    fig3, (ax3, ax4) = plt.subplots(1, 2, figsize=(12, 5))
+    ax3.imshow(sne_map, cmap='viridis')
+    ax3.set_title("Local SNE (32x32, stride 16)")
+    ax4.imshow(lne_map, cmap='viridis')
+    ax4.set_title("Local LNE (32x32, stride 16)")
+    fig3.tight_layout()
+
     fig2, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
     ax1.plot(ngldm_original, 'k')
     ax1.set_title("Original NGLDM")
@@ -133,6 +396,7 @@ def main():
 
     fig.savefig("lab8_images.png")
     fig2.savefig("lab8_ngldm.png")
+    fig3.savefig("lab8_texture_maps.png")
 
     with open("lab_8.md", "w") as f:
         f.write("# Лабораторная работа №8. Текстурный анализ и контрастирование\n\n")
@@ -141,9 +405,24 @@ def main():
         f.write("![Изображения](lab8_images.png)\n\n")
         f.write("### Матрицы NGLDM\n")
         f.write("![NGLDM](lab8_ngldm.png)\n\n")
+        f.write("### Статистики яркости (по кэшу гистограмм)\n")
+        for name, arr in (("Исходное", l_array), ("Преобразованное", l_transformed_array)):
+            p5, p95 = histograms.percentile(arr, [5, 95])
+            f.write(f"- {name}: среднее = {histograms.mean(arr):.2f}, "
+                    f"5-95% = {p5}-{p95}, энтропия = {histograms.entropy(arr):.3f} бит\n")
+        f.write("\n")
+        f.write("### Локальные текстурные карты\n")
+        f.write("![Карты SNE и LNE](lab8_texture_maps.png)\n\n")
         f.write("### Текстурные признаки\n")
         f.write(f"- Исходное изображение: SNE = {sne_original:.4f}, LNE = {lne_original:.4f}\n")
         f.write(f"- Преобразованное изображение: SNE = {sne_transformed:.4f}, LNE = {lne_transformed:.4f}\n\n")
+        f.write(f"### Признаки для разных d ({multi_levels} уровней яркости)\n")
+        f.write("| d | SNE исх. | LNE исх. | SNE преобр. | LNE преобр. |\n")
+        f.write("|---|---|---|---|---|\n")
+        for n, dist in enumerate(distances):
+            f.write(f"| {dist} | {multi_sne[0][n]:.4f} | {multi_lne[0][n]:.4f} | "
+                    f"{multi_sne[1][n]:.4f} | {multi_lne[1][n]:.4f} |\n")
+        f.write("\n")
         f.write("### Выводы\n")
         f.write("В ходе работы было проведено степенное преобразование яркости изображения. ")
         f.write("Анализ текстурных признаков показывает, как изменились характеристики текстуры после преобразования.\n")
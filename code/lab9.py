@@ -5,17 +5,190 @@ from scipy import signal
 from scipy.signal import savgol_filter, wiener
 import soundfile as sf
 import os
+import sys
+import weakref
+from collections import OrderedDict
+from numpy.lib.stride_tricks import sliding_window_view
+
+def segment_energies(audio, samples_per_segment, hop=None):
+    """
+    Энергии сегментов по samples_per_segment отсчетов (неполный хвост отбрасывается).
+    hop=None - сегменты без перекрытия (reshape обрезанного сигнала), иначе кадры
+    со сдвигом hop отсчетов (sliding_window_view без копирования).
+    """
+    if hop is None or hop == samples_per_segment:
+        count = len(audio) // samples_per_segment
+        frames = audio[:count * samples_per_segment].reshape(count, samples_per_segment)
+    elif len(audio) < samples_per_segment:
+        frames = np.empty((0, samples_per_segment))
+    else:
+        frames = sliding_window_view(audio, samples_per_segment)[::hop]
+    return np.einsum('ij,ij->i', frames, frames)
+
+
+def energy_by_resolution(audio, fs, delta_ts, overlap=0.0):
+    """
+    Энергии сегментов для нескольких шагов delta_t за один вызов: {delta_t: энергии}.
+    Без перекрытия энергии на шаге, кратном самому мелкому, суммируются из
+    энергий мелкого шага, остальные считаются по сигналу. overlap - доля перекрытия кадров.
+    """
+    sizes = {delta_t: int(delta_t * fs) for delta_t in delta_ts}
+    if overlap:
+        return {delta_t: segment_energies(audio, size, size - int(size * overlap))
+                for delta_t, size in sizes.items()}
+
+    finest = min(sizes.values())
+    base = segment_energies(audio, finest)
+    return {delta_t: aggregate_energies(base, finest, size, len(audio)) if size % finest == 0
+            else segment_energies(audio, size)
+            for delta_t, size in sizes.items()}
+
+
+def aggregate_energies(finest_energies, finest, size, length):
+    """Энергии сегментов по size отсчетов (size кратно finest) из энергий шага finest."""
+    factor = size // finest
+    count = length // size
+    return finest_energies[:count * factor].reshape(count, factor).sum(axis=1)
+
+
+def top_k_indices(values, k=3):
+    """Номера k наибольших значений по убыванию (argpartition вместо полной сортировки)."""
+    values = np.asarray(values)
+    if k >= len(values):
+        return np.argsort(values)[::-1]
+    top = np.argpartition(values, -k)[-k:]
+    return top[np.argsort(values[top])[::-1]]
+
+
+class SpectralCache:
+    """
+    Кэш спектрограмм с ключом (id сигнала, окно, nperseg, noverlap): каждая
+    спектрограмма считается один раз. Хранимые массивы доступны только для чтения.
+    Занятая память ограничена max_bytes (вытеснение LRU); спектрограмма больше
+    лимита не кэшируется. Записи удаляются вместе с сигналом. Разовые
+    преобразования (cache=False) считаются без сохранения и не вытесняют записи.
+    """
+
+    def __init__(self, fs, max_bytes=256 * 2**20):
+        self.fs = fs
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._tracked = set()
+
+    def _forget(self, signal_id):
+        self._tracked.discard(signal_id)
+        for key in [key for key in self._entries if key[0] == signal_id]:
+            self.nbytes -= sum(array.nbytes for array in self._entries.pop(key))
+
+    def spectrogram(self, audio, window='hann', nperseg=1024, noverlap=512, cache=True):
+        """Частоты, времена и спектральная мощность сигнала audio."""
+        key = (id(audio), window, nperseg, noverlap)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        entry = signal.spectrogram(audio, self.fs, window=window,
+                                   nperseg=nperseg, noverlap=noverlap)
+        for array in entry:
+            array.flags.writeable = False
+        size = sum(array.nbytes for array in entry)
+        if not cache or size > self.max_bytes:
+            return entry
+
+        if key[0] not in self._tracked:
+            weakref.finalize(audio, self._forget, key[0])
+            self._tracked.add(key[0])
+        self._entries[key] = entry
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= sum(array.nbytes for array in evicted)
+        return entry
+
+
+class StreamingSpectrogram:
+    """
+    Спектрограмма, накапливаемая по блокам сигнала длины length. Хвост блока
+    переносится в следующий, поэтому кадры те же, что у signal.spectrogram по всему
+    сигналу. Хранятся только энергия каждого кадра в полосе freq_range и не больше
+    columns усредненных по кадрам столбцов для графика.
+    """
+
+    def __init__(self, fs, length, freq_range, window='hann', nperseg=1024, noverlap=512,
+                 columns=2000):
+        self.fs = fs
+        self.window = window
+        self.nperseg = nperseg
+        self.noverlap = noverlap
+        self.step = nperseg - noverlap
+        self.frames = max((length - noverlap) // self.step, 0)
+        self.columns = max(min(columns, self.frames), 1)
+        self.f = np.fft.rfftfreq(nperseg, 1 / fs)
+        self.band = (self.f >= freq_range[0]) & (self.f <= freq_range[1])
+        self.t = (nperseg / 2 + np.arange(self.frames) * self.step) / fs
+        self.band_energy = np.zeros(self.frames)
+        self._sums = np.zeros((len(self.f), self.columns))
+        self._counts = np.zeros(self.columns, dtype=np.int64)
+        self._carry = np.empty(0)
+        self._done = 0
+
+    def _column(self, frames):
+        return frames * self.columns // max(self.frames, 1)
+
+    def update(self, block):
+        buffer = np.concatenate((self._carry, block))
+        count = 0
+        if len(buffer) >= self.nperseg:
+            count = min((len(buffer) - self.noverlap) // self.step, self.frames - self._done)
+        if count > 0:
+            used = (count - 1) * self.step + self.nperseg
+            _, _, Sxx = signal.spectrogram(buffer[:used], self.fs, window=self.window,
+                                           nperseg=self.nperseg, noverlap=self.noverlap)
+            frames = np.arange(self._done, self._done + count)
+            self.band_energy[frames] = Sxx[self.band].sum(axis=0)
+
+            # номера столбцов не убывают: суммы по столбцам через reduceat
+            column = self._column(frames)
+            starts = np.flatnonzero(np.diff(column, prepend=-1))
+            self._sums[:, column[starts]] += np.add.reduceat(Sxx, starts, axis=1)
+            self._counts[column[starts]] += np.diff(np.append(starts, count))
+            self._done += count
+        self._carry = buffer[count * self.step:]
+
+    def columns_spectrogram(self):
+        """Частоты, времена столбцов и средняя мощность кадров каждого столбца."""
+        counts = np.maximum(self._counts, 1)
+        times = np.bincount(self._column(np.arange(self.frames)), weights=self.t,
+                            minlength=self.columns) / counts
+        return self.f, times, self._sums / counts
+
 
 class AudioLabAnalyzer:
-    def __init__(self, filename):
+    def __init__(self, filename, streaming=False, block_size=2**20):
+        """
+        streaming=True - потоковый режим для длинных записей: файл отображается в память,
+        сигнал читается блоками по block_size отсчетов и нормируется по пику,
+        найденному отдельным проходом. Фильтрация в этом режиме не выполняется.
+        """
         self.filename = filename
-        self.fs, self.audio = wavfile.read(filename)
+        self.streaming = streaming
+        self.block_size = block_size
+        if streaming:
+            self.fs, self._raw = wavfile.read(filename, mmap=True)
+            self.audio = None
+            self.peak = max(np.max(np.abs(block)) for block in self._blocks(normalize=False))
+            self.duration = len(self._raw) / self.fs
+        else:
+            self.fs, self.audio = wavfile.read(filename)
 
-        if len(self.audio.shape) > 1:
-            self.audio = self.audio.mean(axis=1)
+            if len(self.audio.shape) > 1:
+                self.audio = self.audio.mean(axis=1)
 
-        self.audio = self.audio / np.max(np.abs(self.audio))
-        self.duration = len(self.audio) / self.fs
+            self.audio = self.audio / np.max(np.abs(self.audio))
+            self.duration = len(self.audio) / self.fs
+        self.spectra = SpectralCache(self.fs)
         self.noise_level = None
         self.filtered_audio = {
             'savgol': None,
@@ -24,21 +197,71 @@ class AudioLabAnalyzer:
         }
         self.energy_results = {
             'max_times': [],
+            'by_resolution': {},
             'energy_plot': 'energy_analysis.png'
         }
         
     def analyze(self):
-        self._plot_spectrogram(self.audio, 'original_spectrogram.png')
-        self._estimate_noise()
-        self._apply_filters()
-        self._analyze_energy()
+        if self.streaming:
+            self._analyze_streaming()
+        else:
+            self._plot_spectrogram(self.audio, 'original_spectrogram.png')
+            self._estimate_noise()
+            # спектрограммы отфильтрованных сигналов нужны один раз и не кэшируются
+            self._apply_filters()
+            self._analyze_energy()
         self._save_filtered_audio()
         self._generate_report()
-        
-    def _plot_spectrogram(self, audio, save_to, title=None):
+
+    def _blocks(self, normalize=True):
+        """Моно-блоки сигнала из отображенного в память файла"""
+        for start in range(0, len(self._raw), self.block_size):
+            block = np.asarray(self._raw[start:start + self.block_size], dtype=np.float64)
+            if block.ndim > 1:
+                block = block.mean(axis=1)
+            yield block / self.peak if normalize else block
+
+    def _analyze_streaming(self, delta_t=0.1, freq_range=(40, 50), resolutions=(0.5, 1.0)):
+        """Спектрограмма, энергия и оценка шума за один проход по блокам"""
+        spectrogram = StreamingSpectrogram(self.fs, len(self._raw), freq_range,
+                                           window='hann', nperseg=1024, noverlap=512)
+        sizes = {step: int(step * self.fs) for step in (delta_t,) + tuple(resolutions)}
+        finest = min(sizes.values())
+        # по сигналу считаются только самый мелкий шаг и шаги, ему не кратные
+        direct = {finest} | {size for size in sizes.values() if size % finest}
+        noise_samples = int(0.1 * self.fs)
+        noise_est = []
+        energy = {size: [] for size in direct}
+        rest = dict.fromkeys(direct, np.empty(0))
+
+        for block in self._blocks():
+            spectrogram.update(block)
+            if noise_samples > 0:
+                noise_est.append(block[:noise_samples])
+                noise_samples -= len(noise_est[-1])
+            # неполный сегмент переносится в следующий блок
+            for size in direct:
+                buffer = np.concatenate((rest[size], block))
+                energy[size].append(segment_energies(buffer, size))
+                rest[size] = buffer[len(energy[size][-1]) * size:]
+
+        self.noise_level = np.std(np.concatenate(noise_est))
+        energy = {size: np.concatenate(values) for size, values in energy.items()}
+        self._store_energy_peaks({
+            step: energy[size] if size in direct
+            else aggregate_energies(energy[finest], finest, size, len(self._raw))
+            for step, size in sizes.items()
+        }, delta_t)
+        self._draw_spectrogram(*spectrogram.columns_spectrogram(), 'original_spectrogram.png')
+        self._plot_band_energy(spectrogram.t, spectrogram.band_energy, freq_range)
+
+    def _plot_spectrogram(self, audio, save_to, title=None, cache=True):
+        f, t, Sxx = self.spectra.spectrogram(audio, window='hann',
+                                             nperseg=1024, noverlap=512, cache=cache)
+        self._draw_spectrogram(f, t, Sxx, save_to, title)
+
+    def _draw_spectrogram(self, f, t, Sxx, save_to, title=None):
         plt.figure(figsize=(12, 8))
-        f, t, Sxx = signal.spectrogram(audio, self.fs, window='hann', 
-                                      nperseg=1024, noverlap=512)
         plt.pcolormesh(t, f, 10 * np.log10(Sxx), shading='gouraud')
         plt.yscale('log')
         plt.ylabel('Частота [Гц] (лог. шкала)')
@@ -58,36 +281,38 @@ class AudioLabAnalyzer:
         self.filtered_audio['savgol'] = savgol_filter(self.audio, 101, 3)
         self._plot_spectrogram(self.filtered_audio['savgol'], 
                              'savgol_spectrogram.png',
-                             'После фильтра Савицкого-Голея')
+                             'После фильтра Савицкого-Голея', cache=False)
         
         self.filtered_audio['wiener'] = wiener(self.audio)
         self._plot_spectrogram(self.filtered_audio['wiener'], 
                              'wiener_spectrogram.png',
-                             'После фильтра Винера')
+                             'После фильтра Винера', cache=False)
         
         b, a = signal.butter(4, 1000 / (self.fs / 2), 'low')
         self.filtered_audio['lowpass'] = signal.filtfilt(b, a, self.audio)
         self._plot_spectrogram(self.filtered_audio['lowpass'], 
                              'lowpass_spectrogram.png',
-                             'После НЧ-фильтра')
+                             'После НЧ-фильтра', cache=False)
         
-    def _analyze_energy(self, delta_t=0.1, freq_range=(40, 50)):
-        samples_per_segment = int(delta_t * self.fs)
-        num_segments = len(self.audio) // samples_per_segment
-        
-        energy = []
-        for i in range(num_segments):
-            segment = self.audio[i*samples_per_segment : (i+1)*samples_per_segment]
-            energy.append(np.sum(segment**2))
-        
-        self.energy_results['max_times'] = [
-            i * delta_t for i in np.argsort(energy)[-3:][::-1]
-        ]
-        
-        f, t, Sxx = signal.spectrogram(self.audio, self.fs, window='hann', nperseg=1024)
+    def _analyze_energy(self, delta_t=0.1, freq_range=(40, 50), resolutions=(0.5, 1.0)):
+        energy = energy_by_resolution(self.audio, self.fs, (delta_t,) + tuple(resolutions))
+        self._store_energy_peaks(energy, delta_t)
+
+        # то же преобразование, что и для спектрограммы исходного сигнала
+        f, t, Sxx = self.spectra.spectrogram(self.audio, window='hann',
+                                             nperseg=1024, noverlap=512)
         freq_mask = (f >= freq_range[0]) & (f <= freq_range[1])
         energy_in_range = np.sum(Sxx[freq_mask, :], axis=0)
-        
+        self._plot_band_energy(t, energy_in_range, freq_range)
+
+    def _store_energy_peaks(self, energy, delta_t, k=3):
+        self.energy_results['max_times'] = [i * delta_t for i in top_k_indices(energy[delta_t], k)]
+        self.energy_results['by_resolution'] = {
+            step: [i * step for i in top_k_indices(values, k)]
+            for step, values in energy.items() if step != delta_t
+        }
+
+    def _plot_band_energy(self, t, energy_in_range, freq_range):
         plt.figure(figsize=(12, 6))
         plt.plot(t, energy_in_range)
         plt.xlabel('Время [сек]')
@@ -99,10 +324,25 @@ class AudioLabAnalyzer:
     def _save_filtered_audio(self):
         """Сохранение отфильтрованных версий"""
         for name, audio in self.filtered_audio.items():
+            if audio is None:
+                continue
             sf.write(f"audio_{name}.wav", audio, self.fs)
             
     def _generate_report(self):
         """Генерация отчета"""
+        if self.streaming:
+            filters = "Фильтрация не выполнялась (потоковый режим).\n"
+        else:
+            filters = """| Фильтр | Спектрограмма |
+|--------|---------------|
+| Савицкого-Голея | ![Спектрограмма](savgol_spectrogram.png) |
+| Винера | ![Спектрограмма](wiener_spectrogram.png) |
+| Низких частот | ![Спектрограмма](lowpass_spectrogram.png) |
+"""
+        by_resolution = "".join(
+            f"- Шаг {step} сек: {[round(float(t), 2) for t in times]} сек\n"
+            for step, times in self.energy_results['by_resolution'].items()
+        )
         report = f"""# Лабораторная работа №9. Анализ шума
 
 ## 1. Исходные данные
@@ -117,16 +357,12 @@ class AudioLabAnalyzer:
 ![Спектрограмма](original_spectrogram.png)
 
 ### Результаты фильтрации
-| Фильтр | Спектрограмма |
-|--------|---------------|
-| Савицкого-Голея | ![Спектрограмма](savgol_spectrogram.png) |
-| Винера | ![Спектрограмма](wiener_spectrogram.png) |
-| Низких частот | ![Спектрограмма](lowpass_spectrogram.png) |
-
+{filters}
 ## 3. Анализ энергии
 - Шаг анализа: {0.1} сек
 - Анализируемый частотный диапазон: 40-50 Гц
 - Моменты с максимальной энергией: {self.energy_results['max_times']} сек
+{by_resolution}
 
 ![График энергии]({self.energy_results['energy_plot']})
 
@@ -139,5 +375,5 @@ class AudioLabAnalyzer:
 
 # Запуск анализа
 if __name__ == "__main__":
-    analyzer = AudioLabAnalyzer("sound.wav")
+    analyzer = AudioLabAnalyzer("sound.wav", streaming="--stream" in sys.argv[1:])
     analyzer.analyze()
\ No newline at end of file
@@ -0,0 +1,115 @@
+import sys
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image, ImageFont
+
+from lab7 import (classify_features, compute_features_batch, default_font_size, font_path,
+                  get_template_index, tight_glyph)
+from segmentation import segment_page
+
+# text - распознанная строка, boxes - рамки символов (BBOX_DTYPE),
+# hypotheses - для каждого символа список (символ, мера близости)
+RecognizedLine = namedtuple("RecognizedLine", ["line", "text", "boxes", "hypotheses"])
+
+
+class StageTimings:
+    """Счетчики времени по этапам конвейера и число обработанных страниц, строк и символов."""
+
+    STAGES = ("load", "segmentation", "features", "classification")
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.pages = 0
+        self.lines = 0
+        self.glyphs = 0
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+    def pages_per_second(self):
+        return self.pages / self.total_seconds if self.total_seconds else 0.0
+
+    def report(self):
+        stages = ", ".join(f"{name}: {seconds:.3f} c" for name, seconds in self.seconds.items())
+        return (f"Страниц: {self.pages}, строк: {self.lines}, символов: {self.glyphs}; {stages}; "
+                f"{self.pages_per_second():.2f} стр/с")
+
+
+def _crop_glyphs(gray, boxes, margin, threshold):
+    # фрагменты нормируются так же, как эталоны индекса с tight=True
+    return [tight_glyph(gray[box["y0"]:box["y1"], box["x0"]:box["x1"]], margin, threshold)
+            for box in boxes]
+
+
+def _line_text(chars, boxes, space_gap):
+    if len(chars) == 0:
+        return ""
+    if space_gap is None:
+        space_gap = 0.5 * np.median(boxes["x1"] - boxes["x0"])
+    gaps = boxes["x0"][1:] - boxes["x1"][:-1]
+    text = [chars[0]]
+    for char, gap in zip(chars[1:], gaps):
+        if gap > space_gap:
+            text.append(" ")
+        text.append(char)
+    return "".join(text)
+
+
+def recognize_page(page, font=None, top_k=5, margin=10, threshold=128, space_gap=None,
+                   mode="profile", timings=None):
+    """
+    Распознавание страницы: сегментация (segment_page, профили как в lab6), пакетное
+    вычисление признаков lab7 для всех символов строки и классификация по индексу
+    эталонов, обрезанных по символу так же, как фрагменты страницы.
+    Генератор выдает RecognizedLine по одной строке текста.
+    page - путь к файлу, изображение PIL или массив оттенков серого.
+    space_gap - промежуток между символами, считающийся пробелом
+    (по умолчанию половина медианной ширины символа строки).
+    """
+    timings = StageTimings() if timings is None else timings
+    if font is None:
+        font = ImageFont.truetype(font_path, default_font_size)
+    index = get_template_index(font, margin, tight=True)
+
+    with timings.stage("load"):
+        if isinstance(page, str):
+            page = Image.open(page)
+        gray = np.asarray(page.convert("L")) if isinstance(page, Image.Image) else np.asarray(page)
+        index.features  # загрузка или построение индекса эталонов
+    with timings.stage("segmentation"):
+        boxes = segment_page(gray, mode=mode, threshold=threshold)
+        line_numbers, line_starts = np.unique(boxes["line"], return_index=True)
+    timings.pages += 1
+
+    for line, start, end in zip(line_numbers, line_starts, list(line_starts[1:]) + [len(boxes)]):
+        line_boxes = boxes[start:end]
+        with timings.stage("features"):
+            features = compute_features_batch(_crop_glyphs(gray, line_boxes, margin, threshold), threshold)
+        with timings.stage("classification"):
+            best, scores = classify_features(features, index, top_k)
+            hypotheses = [[(index.chars[j], float(score)) for j, score in zip(row, row_scores)]
+                          for row, row_scores in zip(best, scores)]
+            text = _line_text([h[0][0] for h in hypotheses], line_boxes, space_gap)
+        timings.lines += 1
+        timings.glyphs += len(line_boxes)
+        yield RecognizedLine(int(line), text, line_boxes, hypotheses)
+
+
+if __name__ == "__main__":
+    timings = StageTimings()
+    for path in sys.argv[1:] or ["phrase.bmp"]:
+        for result in recognize_page(path, timings=timings):
+            print(f"{path} [{result.line}]: {result.text}")
+    print(timings.report())
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# panels - кортеж панелей (вид, значения, заголовок), вид 'bar' или 'barh'
+PlotJob = namedtuple("PlotJob", ["path", "panels", "figsize", "tight_layout"])
+
+
+def profile_chart(path, panels, figsize=None, tight_layout=False):
+    return PlotJob(path, tuple((kind, np.asarray(values), title) for kind, values, title in panels),
+                   None if figsize is None else tuple(figsize), tight_layout)
+
+
+# фигуры процесса: одна на каждую раскладку (размер, число панелей)
+_figures = {}
+
+
+def _use_agg():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _figure_for(job):
+    import matplotlib.pyplot as plt
+    key = (job.figsize, len(job.panels))
+    if key not in _figures:
+        fig, axes = plt.subplots(1, len(job.panels), figsize=job.figsize, squeeze=False)
+        _figures[key] = (fig, axes[0])
+    return _figures[key]
+
+
+def _render(job):
+    fig, axes = _figure_for(job)
+    for ax, (kind, values, title) in zip(axes, job.panels):
+        ax.cla()
+        getattr(ax, kind)(range(len(values)), values)
+        ax.set_title(title)
+    if job.tight_layout:
+        fig.tight_layout()
+    fig.savefig(job.path)
+    return job.path
+
+
+def _render_chunk(jobs):
+    return [_render(job) for job in jobs]
+
+
+def job_hash(job):
+    digest = hashlib.sha1(repr((job.path, job.figsize, job.tight_layout)).encode("utf-8"))
+    for kind, values, title in job.panels:
+        digest.update(f"{kind}|{title}|{values.dtype.str}|{values.shape}".encode("utf-8"))
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+def render_plots(jobs, workers=None, manifest_path=None, chunk_size=8):
+    """
+    Отрисовка собранных графиков после расчета признаков в пуле процессов с бэкендом Agg.
+    Каждый процесс переиспользует одну фигуру и оси на раскладку вместо новой фигуры
+    на график. Если задан manifest_path, графики с неизменившимися данными
+    (по хэшу, сохраненному в этом JSON-файле) и существующим PNG пропускаются.
+    Без метода запуска fork (Windows) отрисовка идет в текущем процессе: скрипты
+    лабораторных не защищены if __name__ == "__main__" и не переживут spawn.
+    Возвращает список перерисованных файлов.
+    """
+    manifest = {}
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    hashes = {job.path: job_hash(job) for job in jobs}
+    todo = [job for job in jobs
+            if not (manifest.get(job.path) == hashes[job.path] and os.path.exists(job.path))]
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+
+    rendered = []
+    if "fork" in multiprocessing.get_all_start_methods() and workers != 0:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                 initializer=_use_agg) as executor:
+            for paths in executor.map(_render_chunk, chunks):
+                rendered.extend(paths)
+    elif chunks:
+        _use_agg()
+        for chunk in chunks:
+            rendered.extend(_render_chunk(chunk))
+
+    if manifest_path:
+        manifest.update({path: hashes[path] for path in rendered})
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+    return rendered
@@ -0,0 +1,119 @@
+import numpy as np
+
+# рамки символов: номер строки и координаты, x1 и y1 не включаются
+BBOX_DTYPE = np.dtype([("line", np.int32), ("x0", np.int32), ("y0", np.int32),
+                       ("x1", np.int32), ("y1", np.int32)])
+
+
+def find_runs(mask):
+    """Начала и концы (не включая) серий True в одномерной маске."""
+    edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def ink_mask(image, threshold=128):
+    data = np.asarray(image)
+    if data.dtype == bool:
+        return data
+    return data < threshold
+
+
+def segment_lines(ink, line_threshold=0):
+    """Строки текста - серии строк пикселей, где горизонтальный профиль больше line_threshold."""
+    return find_runs(ink.sum(axis=1) > line_threshold)
+
+
+def _profile_boxes(ink, line_threshold, char_threshold):
+    boxes = []
+    for line, (top, bottom) in enumerate(zip(*segment_lines(ink, line_threshold))):
+        band = ink[top:bottom]
+        starts, ends = find_runs(band.sum(axis=0) > char_threshold)
+        if len(starts) == 0:
+            continue
+        # строки, занятые каждым символом: суммы по столбцам [start, end) через reduceat
+        padded = np.pad(band, ((0, 0), (0, 1)))
+        bounds = np.stack([starts, ends], axis=1).ravel()
+        rows = np.add.reduceat(padded, bounds, axis=1)[:, ::2] > 0
+        y0 = top + np.argmax(rows, axis=0)
+        y1 = top + rows.shape[0] - np.argmax(rows[::-1], axis=0)
+
+        line_boxes = np.empty(len(starts), dtype=BBOX_DTYPE)
+        line_boxes["line"] = line
+        line_boxes["x0"], line_boxes["x1"] = starts, ends
+        line_boxes["y0"], line_boxes["y1"] = y0, y1
+        boxes.append(line_boxes)
+    return np.concatenate(boxes) if boxes else np.empty(0, dtype=BBOX_DTYPE)
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _row_runs(ink):
+    # серии единиц во всех строках сразу: (строка, начало, конец)
+    edges = np.diff(np.pad(ink, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+
+def _component_boxes(ink, line_threshold):
+    rows, starts, ends = _row_runs(ink)
+    if len(rows) == 0:
+        return np.empty(0, dtype=BBOX_DTYPE)
+    row_ptr = np.searchsorted(rows, np.arange(ink.shape[0] + 1))
+
+    # объединение серий соседних строк, касающихся хотя бы по диагонали (8-связность)
+    parent = list(range(len(rows)))
+    for r in range(ink.shape[0] - 1):
+        a0, a1, b1 = row_ptr[r], row_ptr[r + 1], row_ptr[r + 2]
+        if a0 == a1 or a1 == b1:
+            continue
+        lo = a1 + np.searchsorted(ends[a1:b1], starts[a0:a1], side="left")
+        hi = a1 + np.searchsorted(starts[a1:b1], ends[a0:a1], side="right")
+        for a, (b_lo, b_hi) in enumerate(zip(lo.tolist(), hi.tolist()), start=a0):
+            for b in range(b_lo, b_hi):
+                root_a, root_b = _find(parent, a), _find(parent, b)
+                if root_a != root_b:
+                    parent[root_b] = root_a
+
+    roots = np.array([_find(parent, i) for i in range(len(parent))])
+    _, labels = np.unique(roots, return_inverse=True)
+    count = labels.max() + 1
+
+    x0 = np.full(count, ink.shape[1])
+    x1 = np.zeros(count, dtype=np.int64)
+    y0 = np.full(count, ink.shape[0])
+    y1 = np.zeros(count, dtype=np.int64)
+    np.minimum.at(x0, labels, starts)
+    np.maximum.at(x1, labels, ends)
+    np.minimum.at(y0, labels, rows)
+    np.maximum.at(y1, labels, rows + 1)
+
+    # компонента относится к строке текста, в которую попадает ее середина
+    line_starts, _ = segment_lines(ink, line_threshold)
+    centers = (y0 + y1 - 1) // 2
+    lines = np.maximum(np.searchsorted(line_starts, centers, side="right") - 1, 0)
+
+    boxes = np.empty(count, dtype=BBOX_DTYPE)
+    boxes["line"], boxes["x0"], boxes["y0"], boxes["x1"], boxes["y1"] = lines, x0, y0, x1, y1
+    return boxes[np.lexsort((boxes["x0"], boxes["line"]))]
+
+
+def segment_page(image, mode="profile", line_threshold=0, char_threshold=2, threshold=128):
+    """
+    Сегментация страницы: сначала строки по горизонтальному профилю, затем символы.
+    mode='profile' - символы по сериям вертикального профиля каждой строки (как в lab6),
+    mode='components' - связные компоненты (объединение серий пикселей), для
+    символов, перекрывающихся по проекции на ось X.
+    Возвращает структурированный массив BBOX_DTYPE, упорядоченный по строкам и X.
+    """
+    ink = ink_mask(image, threshold)
+    if mode == "profile":
+        return _profile_boxes(ink, line_threshold, char_threshold)
+    if mode == "components":
+        return _component_boxes(ink, line_threshold)
+    raise ValueError(f"Неизвестный режим сегментации: {mode}")